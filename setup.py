@@ -0,0 +1,24 @@
+"""
+Optional native build of the shared helpers with mypyc.
+
+    pip install mypy
+    python setup.py build_ext --inplace
+
+This compiles src/common.py (money, compute_fee, TransferRecord) into an
+extension module placed next to it in src/, which Python then imports
+instead of the .py file. Delete src/common.*.so to go back to pure Python.
+
+fee_cents is not compiled: it is generated from FEE_RULES and exec'd at
+import, so it runs as interpreted Python in either build.
+
+bas_server.py is not compiled: Pyro5's @expose tags every method object
+with an attribute, which mypyc-compiled methods do not allow.
+"""
+from setuptools import setup
+from mypyc.build import mypycify
+
+setup(
+    name="ds-banking-native",
+    package_dir={"": "src"},
+    ext_modules=mypycify(["--ignore-missing-imports", "src/common.py"]),
+)
@@ -1,13 +1,116 @@
 from __future__ import annotations
 
+import itertools
+import os
 import time
-import secrets
-from decimal import Decimal
-from typing import Dict, Any, Optional
+import threading
+from typing import Dict, Any, List, Optional, Tuple
 
 import Pyro5.api
 
-from common import money, compute_fee, new_id
+from common import BAS_THREADPOOL_SIZE, fee_cents, from_cents, money_cents
+
+# msgpack is C-backed and much faster than Pyro's default serpent
+# serializer; fall back to serpent when it isn't installed.
+try:
+    import msgpack  # noqa: F401
+    Pyro5.config.SERIALIZER = "msgpack"
+except ImportError:
+    pass
+
+# Attempts at execute_transfer while BDB reports its write lock busy
+TRANSFER_RETRIES = 5
+
+# Seconds a cached balance is served before BDB is asked again; bounds
+# how long writes made outside this BAS go unseen
+BALANCE_CACHE_TTL = 2.0
+
+# Session table: fixed number of slots (power of two), slots probed per
+# token, and session lifetime in seconds
+SESSION_CAPACITY = 4096
+SESSION_PROBES = 8
+SESSION_TTL = 30 * 60
+
+# Session slot states
+EMPTY, INSERTING, OCCUPIED, TOMBSTONE = range(4)
+
+# Random bytes drawn from the OS per refill of the token entropy buffer
+ENTROPY_BUF_SIZE = 4096
+
+class SessionTable:
+    """
+    Fixed-capacity token -> username map with per-slot state.
+
+    Each slot moves EMPTY -> INSERTING -> OCCUPIED -> TOMBSTONE. A slot's
+    entry is written before its state is published as OCCUPIED, so get()
+    never takes a lock. Writers claim slots under a lock. Slots never go back
+    to EMPTY, so a lookup can stop at the first EMPTY slot in its window.
+    """
+
+    def __init__(self, capacity: int = SESSION_CAPACITY, ttl: float = SESSION_TTL):
+        assert capacity & (capacity - 1) == 0, "capacity must be a power of two"
+        self._mask = capacity - 1
+        self._ttl = ttl
+        self._state = bytearray(capacity)
+        self._entries: List[Optional[Tuple[str, str, float]]] = [None] * capacity
+        self._lock = threading.Lock()
+
+    def get(self, token: str) -> Optional[str]:
+        """Return the username for a live session token, or None."""
+        state = self._state
+        entries = self._entries
+        base = hash(token)
+        for i in range(SESSION_PROBES):
+            idx = (base + i) & self._mask
+            st = state[idx]
+            if st == EMPTY:
+                return None
+            if st == OCCUPIED:
+                entry = entries[idx]
+                if entry is not None and entry[0] == token:
+                    return entry[1] if entry[2] > time.monotonic() else None
+        return None
+
+    def put(self, token: str, username: str) -> None:
+        """
+        Store a session in the first free or expired slot of the token's
+        probe window, evicting the oldest session if all are live.
+        """
+        now = time.monotonic()
+        base = hash(token)
+        state = self._state
+        entries = self._entries
+        with self._lock:
+            victim = base & self._mask
+            oldest = float("inf")
+            for i in range(SESSION_PROBES):
+                idx = (base + i) & self._mask
+                entry = entries[idx]
+                if state[idx] != OCCUPIED or entry is None or entry[2] <= now:
+                    victim = idx
+                    break
+                if entry[2] < oldest:
+                    victim, oldest = idx, entry[2]
+            state[victim] = INSERTING
+            entries[victim] = (token, username, now + self._ttl)
+            state[victim] = OCCUPIED
+
+    def discard(self, token: str) -> bool:
+        """Tombstone a session; returns False if the token was not found."""
+        base = hash(token)
+        with self._lock:
+            for i in range(SESSION_PROBES):
+                idx = (base + i) & self._mask
+                st = self._state[idx]
+                if st == EMPTY:
+                    return False
+                entry = self._entries[idx]
+                if st == OCCUPIED and entry is not None and entry[0] == token:
+                    self._state[idx] = TOMBSTONE
+                    self._entries[idx] = None
+                    return True
+        return False
+
 
 @Pyro5.api.expose
 class BankApplicationServer:
@@ -16,30 +119,87 @@ class BankApplicationServer:
     - Communicates with BDB server for persistent storage
     - Handles authentication, business logic, and transfer processing
     - Provides RPC methods for:
-      login, balance query, submit transfer, transfer status.
+      login, logout, balance query, submit transfer, transfer status.
     """
 
-    def __init__(self, bdb_uri: Optional[str] = None):
+    def __init__(self, bdb_uri: Optional[str] = None, cache_balances: bool = True):
         """
         Initialize BAS server.
         
         Args:
             bdb_uri: URI to BDB server (e.g., "PYRO:BDB@127.0.0.1:9091")
+            cache_balances: Serve repeat balance queries from memory for up
+                to BALANCE_CACHE_TTL seconds. Balances written elsewhere
+                (another BAS, update_balance) can be that stale; turn it
+                off when that matters.
         """
         # Default BDB URI
         if bdb_uri is None:
             bdb_uri = "PYRO:BDB@127.0.0.1:9091"
         
-        # Connect to BDB server
-        self.bdb = Pyro5.api.Proxy(bdb_uri)
+        # BDB proxies are created per worker thread (see _get_bdb)
+        self.bdb_uri = bdb_uri
+        self._local = threading.local()
         
         # Sessions (token -> username) - kept in-memory on BAS
-        self.sessions: Dict[str, str] = {}
+        self.sessions = SessionTable()
+        self._sess_get = self.sessions.get  # bound once for _require_user
+
+        # Session tokens are sliced from one os.urandom() buffer
+        self._entropy_buf = os.urandom(ENTROPY_BUF_SIZE)
+        self._entropy_off = 0
+        self._entropy_lock = threading.Lock()
+
+        # Transfer IDs: per-process prefix (start time + pid) plus a counter;
+        # unique across restarts and sortable within one process.
+        self._tr_epoch = f"{int(time.time()):x}{os.getpid():x}"
+        self._tr_counter = itertools.count(1)
+
+        # Balance cache (username -> (balance, version, expires)). A live
+        # entry only moves forward in version, so out-of-order replies can't
+        # make it stale; an expired one is replaced whatever its version, so
+        # versions that went backwards (e.g. a reset database) can't pin it.
+        self._bal_cache: Optional[Dict[str, Tuple[str, int, float]]] = {} if cache_balances else None
+        self._bal_lock = threading.Lock()
 
     # ---------- helpers ----------
+    def _get_bdb(self) -> Pyro5.api.Proxy:
+        """
+        Return this thread's BDB proxy, connecting on first use.
+
+        Pyro proxies are owned by the thread that created them, so each
+        daemon worker keeps its own proxy and TCP connection to BDB.
+        """
+        bdb = getattr(self._local, "bdb", None)
+        if bdb is None:
+            bdb = Pyro5.api.Proxy(self.bdb_uri)
+            bdb._pyroBind()
+            self._local.bdb = bdb
+        return bdb
+
+    def _new_token(self) -> str:
+        """Return a 32-char hex session token from the entropy buffer."""
+        with self._entropy_lock:
+            off = self._entropy_off
+            if off + 16 > ENTROPY_BUF_SIZE:
+                self._entropy_buf = os.urandom(ENTROPY_BUF_SIZE)
+                off = 0
+            self._entropy_off = off + 16
+            return self._entropy_buf[off:off + 16].hex()
+
+    def _cache_balance(self, user: str, balance: str, version: int) -> None:
+        """Record a balance unless a live cache entry has a newer version."""
+        if self._bal_cache is None:
+            return
+        now = time.monotonic()
+        with self._bal_lock:
+            cached = self._bal_cache.get(user)
+            if cached is None or cached[2] <= now or cached[1] < version:
+                self._bal_cache[user] = (balance, version, now + BALANCE_CACHE_TTL)
+
     def _require_user(self, token: str) -> str:
         """Verify token and return username."""
-        user = self.sessions.get(token)
+        user = self._sess_get(token)
         if not user:
             raise ValueError("401 Unauthorized: invalid/expired token")
         return user
@@ -49,22 +209,37 @@ class BankApplicationServer:
         """Authenticate user against BDB and create session."""
         try:
             # Verify credentials with BDB
-            if not self.bdb.verify_user(username, password):
+            if not self._get_bdb().verify_user(username, password):
                 return {"ok": False, "error": "Invalid credentials"}
 
             # Create session token
-            token = secrets.token_hex(16)
-            self.sessions[token] = username
+            token = self._new_token()
+            self.sessions.put(token, username)
             return {"ok": True, "token": token}
         except Exception as e:
             return {"ok": False, "error": f"Login error: {str(e)}"}
 
+    def logout(self, token: str) -> Dict[str, Any]:
+        """End a session so its token can no longer be used."""
+        try:
+            if not self.sessions.discard(token):
+                return {"ok": False, "error": "401 Unauthorized: invalid/expired token"}
+            return {"ok": True}
+        except Exception as e:
+            return {"ok": False, "error": f"Logout error: {str(e)}"}
+
     def get_balance(self, token: str) -> Dict[str, Any]:
         """Get account balance from BDB."""
         try:
             user = self._require_user(token)
-            balance = self.bdb.get_balance(user)
-            if balance is not None:
+            cached = self._bal_cache.get(user) if self._bal_cache is not None else None
+            if cached is not None and cached[2] > time.monotonic():
+                return {"ok": True, "user": user, "balance": cached[0]}
+
+            res = self._get_bdb().get_balance_version(user)
+            if res is not None:
+                balance, version = res
+                self._cache_balance(user, balance, version)
                 return {"ok": True, "user": user, "balance": balance}
             else:
                 return {"ok": False, "error": "Account not found"}
@@ -78,92 +253,44 @@ class BankApplicationServer:
         try:
             sender = self._require_user(token)
 
-            # Validation: Check if recipient exists
-            recipient_user = self.bdb.get_user(recipient)
-            if not recipient_user:
-                return {"ok": False, "error": "Invalid recipient account"}
-            
             if recipient == sender:
                 return {"ok": False, "error": "Recipient cannot be the sender"}
 
             try:
-                amount = money(amount_str)
+                amount_c = money_cents(amount_str)
             except Exception:
                 return {"ok": False, "error": "Invalid amount format"}
 
-            if amount <= money("0.00"):
+            if amount_c <= 0:
                 return {"ok": False, "error": "Amount must be > 0"}
 
-            # Calculate fee
-            fee = compute_fee(amount)
-            total = amount + fee
-
-            # Get sender's current balance from BDB
-            balance_str = self.bdb.get_balance(sender)
-            if balance_str is None:
-                return {"ok": False, "error": "Sender account not found"}
-            
-            sender_balance = money(balance_str)
-
-            # Check for insufficient funds
-            if sender_balance < total:
-                transfer_id = new_id("tr")
-                transfer_record = {
-                    "transfer_id": transfer_id,
-                    "from": sender,
-                    "to": recipient,
-                    "amount": str(amount),
-                    "fee": str(fee),
-                    "reference": reference,
-                    "status": "FAILED",
-                    "reason": "Insufficient funds",
-                    "created_at": int(time.time()),
-                    "updated_at": int(time.time()),
-                }
-                # Store failed transfer in BDB
-                self.bdb.create_transfer(transfer_record)
-                return {"ok": False, "error": "Insufficient funds", "transfer_id": transfer_id}
-
-            # Process transfer: Create record, update balances
-            transfer_id = new_id("tr")
-            transfer_record = {
-                "transfer_id": transfer_id,
-                "from": sender,
-                "to": recipient,
-                "amount": str(amount),
-                "fee": str(fee),
-                "reference": reference,
-                "status": "COMPLETED",
-                "reason": "",
-                "created_at": int(time.time()),
-                "updated_at": int(time.time()),
-            }
+            # Calculate fee (all arithmetic in integer cents)
+            fee_c = fee_cents(amount_c)
 
-            # Store transfer record in BDB
-            if not self.bdb.create_transfer(transfer_record):
-                return {"ok": False, "error": "Failed to create transfer record"}
-
-            # Update sender's balance (debit: amount + fee)
-            new_sender_balance = sender_balance - total
-            if not self.bdb.update_balance(sender, str(new_sender_balance)):
-                return {"ok": False, "error": "Failed to update sender balance"}
-
-            # Update recipient's balance (credit: amount only)
-            recipient_balance_str = self.bdb.get_balance(recipient)
-            if recipient_balance_str is None:
-                return {"ok": False, "error": "Recipient account error"}
-            
-            recipient_balance = money(recipient_balance_str)
-            new_recipient_balance = recipient_balance + amount
-            if not self.bdb.update_balance(recipient, str(new_recipient_balance)):
-                return {"ok": False, "error": "Failed to update recipient balance"}
+            transfer_id = f"tr_{self._tr_epoch}_{next(self._tr_counter):x}"
+
+            # Recipient check, funds check, both balance updates and the
+            # transfer record all happen in one atomic BDB call. BDB reports
+            # retry=True when it could not get the database write lock.
+            execute_transfer = self._get_bdb().execute_transfer
+            for _ in range(TRANSFER_RETRIES):
+                res = execute_transfer(sender, recipient, amount_c, fee_c, transfer_id, reference)
+                if not res.get("retry"):
+                    break
+            else:
+                return {"ok": False, "error": "Transfer conflict, please try again"}
+            if not res.get("ok"):
+                return res
+
+            self._cache_balance(sender, res["new_sender_balance"], res["sender_version"])
+            self._cache_balance(recipient, res["new_recipient_balance"], res["recipient_version"])
 
             return {
                 "ok": True,
                 "transfer_id": transfer_id,
                 "status": "COMPLETED",
-                "fee": str(fee),
-                "sender_new_balance": str(new_sender_balance),
+                "fee": from_cents(fee_c),
+                "sender_new_balance": res["new_sender_balance"],
             }
 
         except ValueError as e:
@@ -174,9 +301,11 @@ class BankApplicationServer:
     def get_transfer_status(self, token: str, transfer_id: str) -> Dict[str, Any]:
         """Get transfer status from BDB."""
         try:
-            _ = self._require_user(token)
-            transfer = self.bdb.get_transfer(transfer_id)
-            if not transfer:
+            user = self._require_user(token)
+            transfer = self._get_bdb().get_transfer(transfer_id)
+            # Transfer IDs are sequential, so only show a transfer to its
+            # sender or recipient
+            if not transfer or user not in (transfer["from"], transfer["to"]):
                 return {"ok": False, "error": "Transfer not found"}
             return {"ok": True, "transfer": transfer}
         except ValueError as e:
@@ -189,7 +318,13 @@ def main():
     """Start BAS daemon + register server object."""
     # Default BDB URI - ensure BDB server is running first!
     bdb_uri = "PYRO:BDB@127.0.0.1:9091"
-    
+
+    # Handlers mostly wait on BDB, so run a threaded daemon with a pool
+    # sized well past the core count; each worker has its own BDB proxy.
+    Pyro5.config.SERVERTYPE = "thread"
+    Pyro5.config.THREADPOOL_SIZE = BAS_THREADPOOL_SIZE
+    Pyro5.config.THREADPOOL_SIZE_MIN = 8
+
     daemon = Pyro5.api.Daemon(host="127.0.0.1", port=9090)
     uri = daemon.register(BankApplicationServer(bdb_uri), objectId="BAS")
 
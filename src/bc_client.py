@@ -1,11 +1,63 @@
+import sys
 import Pyro5.api
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, Iterable
+
+# Use the faster msgpack serializer when available (BAS does the same)
+try:
+    import msgpack  # noqa: F401
+    Pyro5.config.SERIALIZER = "msgpack"
+except ImportError:
+    pass
 
 BAS_URI = "PYRO:BAS@127.0.0.1:9090"  # We'll override this automatically below
 
 def prompt(msg: str) -> str:
     return input(msg).strip()
 
+def run_script(bas: Pyro5.api.Proxy, lines: Iterable[str]) -> int:
+    """
+    Run line-oriented commands against BAS without prompts.
+
+    Commands (one per line, blank lines and # comments ignored):
+      login <username> <password>
+      balance
+      transfer <recipient> <amount> [reference...]
+      status <transfer_id>
+      logout
+    Calls are issued back-to-back over the same proxy connection.
+    Returns the number of failed commands.
+    """
+    token = None
+    failures = 0
+    for lineno, line in enumerate(lines, 1):
+        parts = line.split()
+        if not parts or parts[0].startswith("#"):
+            continue
+        cmd, args = parts[0].lower(), parts[1:]
+        try:
+            if cmd == "login" and len(args) == 2:
+                res = bas.login(args[0], args[1])
+                if res.get("ok"):
+                    token = res["token"]
+            elif cmd == "balance" and not args:
+                res = bas.get_balance(token)
+            elif cmd == "transfer" and len(args) >= 2:
+                res = bas.submit_transfer(token, args[0], args[1], " ".join(args[2:]))
+            elif cmd == "status" and len(args) == 1:
+                res = bas.get_transfer_status(token, args[0])
+            elif cmd == "logout" and not args:
+                res = bas.logout(token)
+                token = None
+            else:
+                res = {"ok": False, "error": f"Unrecognised command: {line.strip()}"}
+        except Exception as e:
+            res = {"ok": False, "error": f"RPC error: {e}"}
+
+        if not res.get("ok"):
+            failures += 1
+        print(f"{lineno}: {cmd} -> {res}")
+    return failures
+
 def login_menu():
     """Print the login menu."""
     print("\n=== Banking Client (Phase 1) ===")
@@ -28,6 +80,12 @@ def main():
     #
     # To avoid confusion, we'll ask you to paste the URI printed by BAS once.
 
+    if not sys.stdin.isatty():
+        # Scripted/batch mode: first line is the BAS URI, the rest are commands
+        uri = sys.stdin.readline().strip()
+        bas = Pyro5.api.Proxy(uri)
+        return 1 if run_script(bas, sys.stdin) else 0
+
     uri = prompt("Paste BAS URI from server terminal: ")
     bas = Pyro5.api.Proxy(uri)
 
@@ -63,7 +121,7 @@ def main():
 
             elif choice == "0":
                 print("Goodbye!")
-                break
+                return 0
             else:
                 print("Invalid option.")
 
@@ -128,6 +186,10 @@ def main():
 
             elif choice == "4":
                 # Logout
+                try:
+                    bas.logout(token)
+                except Exception as e:
+                    print("Logout RPC error:", e)
                 token = None
                 username = None
                 print("Logged out successfully. Returning to login menu.")
@@ -136,4 +198,4 @@ def main():
                 print("Invalid option.")
 
 if __name__ == "__main__":
-    main()
+    sys.exit(main())
@@ -8,30 +8,279 @@ Manages SQLite database and provides RPC interface for BAS
 import sqlite3
 import os
 import hashlib
+import atexit
+import hmac
+import json
+import queue
+import threading
 import Pyro5.api
 from contextlib import contextmanager
-from typing import Dict, Any, List, Optional, Tuple
+from typing import Dict, Any, List, Optional, Tuple, Union
 from decimal import Decimal
 import time
 
-from common import money
+from common import BAS_THREADPOOL_SIZE, TransferRecord, from_cents, money_cents, to_cents
 
 DATABASE_FILE = "banking.db"
 
+# transfers columns in TransferRecord field order
+TRANSFER_COLUMNS = (
+    "transfer_id, from_user, to_user, amount, fee, reference, status, reason, created_at, updated_at"
+)
+
+# SQL expression formatting an integer cents column like from_cents(); the
+# sign is added separately since / and % truncate toward zero
+_CENTS_TEXT = (
+    "CASE WHEN {0} < 0 THEN '-' ELSE '' END || "
+    "printf('%d.%02d', abs({0}) / 100, abs({0}) % 100)"
+)
+
+# transfers row as a JSON object with the API keys of TransferRecord.to_dict()
+TRANSFER_JSON = (
+    "json_object('transfer_id', transfer_id, 'from', from_user, 'to', to_user, "
+    f"'amount', {_CENTS_TEXT.format('amount')}, "
+    f"'fee', {_CENTS_TEXT.format('fee')}, "
+    "'reference', reference, 'status', status, "
+    "'reason', reason, 'created_at', created_at, 'updated_at', updated_at)"
+)
+
+
+def _tuple_cursor(conn: sqlite3.Connection) -> sqlite3.Cursor:
+    """Cursor yielding plain tuples, for rows read by position (cheaper than sqlite3.Row)."""
+    cursor = conn.cursor()
+    cursor.row_factory = None
+    return cursor
+
+
+def _json_rows(rows: List[Tuple[Any, ...]], col: int = 0) -> List[Dict[str, Any]]:
+    """Parse one json_object() column from every row with a single json.loads."""
+    return json.loads("[" + ",".join([row[col] for row in rows]) + "]")
+
+
+# Per-connection settings. journal_mode=WAL is stored in the database file
+# itself and is set once in init_database.
+CONNECTION_PRAGMAS = (
+    "PRAGMA synchronous=NORMAL",  # WAL is still crash-safe; fewer fsyncs
+    "PRAGMA busy_timeout=5000",  # wait for the writer instead of SQLITE_BUSY
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-20000",  # ~20 MB page cache
+)
+
+
+# Seconds a get_user result (including "no such user") is served from memory
+USER_CACHE_TTL = 60
+# Most get_user results kept; the oldest go first
+USER_CACHE_SIZE = 1024
+
+# Oldest SQLite with UPDATE ... RETURNING, which balance and transfer
+# writes rely on
+MIN_SQLITE_VERSION = (3, 35, 0)
+
+# Largest page get_transfers_page will return
+MAX_TRANSFER_PAGE = 500
+
+# Daemon worker threads; each keeps one SQLite connection open (see get_db).
+# Pyro's thread server ties a worker to each client connection, and every
+# BAS worker holds one, so the pool must cover the whole BAS pool plus some
+# room for other clients. Only THREADPOOL_MIN threads are started up front.
+THREADPOOL_SIZE = BAS_THREADPOOL_SIZE + 16
+THREADPOOL_MIN = 16
+
+_local = threading.local()
+
+
+def _connect() -> sqlite3.Connection:
+    """Open a configured database connection."""
+    conn = sqlite3.connect(DATABASE_FILE, check_same_thread=False, isolation_level="DEFERRED")
+    conn.row_factory = sqlite3.Row  # Return rows as dicts
+    for pragma in CONNECTION_PRAGMAS:
+        conn.execute(pragma)
+    return conn
+
+
+# Audit entries (operation, username, details, timestamp) are written by a
+# background thread in batches, so RPCs never wait on audit INSERTs.
+AuditEntry = Tuple[str, str, Optional[str], int]
+AUDIT_QUEUE: "queue.Queue[Optional[AuditEntry]]" = queue.Queue()  # None = stop
+AUDIT_BATCH_SIZE = 256  # max entries per transaction
+AUDIT_FLUSH_INTERVAL = 0.05  # seconds to wait for more entries once one arrives
+AUDIT_RETRY_DELAY = 0.1  # first pause after a failed write; doubles up to 2 s
+AUDIT_SHUTDOWN_RETRIES = 3  # attempts left for the last batch before giving up
+_audit_thread: Optional[threading.Thread] = None
+_audit_lock = threading.Lock()
+
+AUDIT_INSERT = "INSERT INTO audit_logs (operation, username, details, timestamp) VALUES (?, ?, ?, ?)"
+
+
+def _audit_writer() -> None:
+    """Drain AUDIT_QUEUE into audit_logs on a dedicated connection."""
+    conn = _connect()
+    stopping = False
+    while not stopping:
+        batch: List[AuditEntry] = []
+        taken = 0
+        entry = AUDIT_QUEUE.get()
+        deadline = time.monotonic() + AUDIT_FLUSH_INTERVAL
+        while True:
+            taken += 1
+            if entry is None:
+                stopping = True
+                break
+            batch.append(entry)
+            remaining = deadline - time.monotonic()
+            if len(batch) >= AUDIT_BATCH_SIZE or remaining <= 0:
+                break
+            try:
+                entry = AUDIT_QUEUE.get(timeout=remaining)
+            except queue.Empty:
+                break
+
+        try:
+            if batch:
+                _write_audit_batch(conn, batch, stopping)
+        finally:
+            for _ in range(taken):
+                AUDIT_QUEUE.task_done()
+    conn.close()
+
+
+def _write_audit_batch(conn: sqlite3.Connection, batch: List[AuditEntry], stopping: bool) -> None:
+    """
+    Insert one batch in a single transaction. A database locked or busy
+    past busy_timeout is retried with backoff until the write succeeds, or
+    only AUDIT_SHUTDOWN_RETRIES times once stopping. Newer entries wait in
+    AUDIT_QUEUE meanwhile. Any other error drops the batch.
+    """
+    delay = AUDIT_RETRY_DELAY
+    attempts = 0
+    while True:
+        try:
+            with conn:  # one transaction per batch
+                conn.executemany(AUDIT_INSERT, batch)
+            return
+        except sqlite3.OperationalError as e:
+            attempts += 1
+            # Disk full, read-only database, missing table, ... won't clear up
+            if "locked" not in str(e) or (stopping and attempts >= AUDIT_SHUTDOWN_RETRIES):
+                print(f"Audit write failed, {len(batch)} entries lost: {e}")
+                return
+            if attempts == 1:
+                print(f"Audit write failed, retrying: {e}")
+            time.sleep(delay)
+            delay = min(delay * 2, 2.0)
+        except Exception as e:
+            print(f"Audit write failed, {len(batch)} entries lost: {e}")
+            return
+
+
+def _start_audit_writer() -> None:
+    """Start the audit writer thread once per process."""
+    global _audit_thread
+    with _audit_lock:
+        if _audit_thread is None:
+            _audit_thread = threading.Thread(target=_audit_writer, name="audit-writer", daemon=True)
+            _audit_thread.start()
+            atexit.register(_stop_audit_writer)
+
+
+def _stop_audit_writer(timeout: float = 30.0) -> None:
+    """Write out everything still queued and stop the audit writer."""
+    global _audit_thread
+    with _audit_lock:
+        thread, _audit_thread = _audit_thread, None
+    if thread is not None and thread.is_alive():
+        AUDIT_QUEUE.put(None)
+        thread.join(timeout)
+
+
+# Table definitions, shared by init_database and the migrations that
+# rebuild a table. Money columns hold integer cents. users and accounts
+# are keyed by username, so WITHOUT ROWID stores each as a single B-tree.
+USERS_SCHEMA = """(
+    username TEXT PRIMARY KEY,
+    password_hash BLOB NOT NULL,
+    email TEXT,
+    created_at INTEGER
+) WITHOUT ROWID"""
+
+ACCOUNTS_SCHEMA = """(
+    username TEXT PRIMARY KEY,
+    balance INTEGER NOT NULL,
+    created_at INTEGER,
+    version INTEGER NOT NULL DEFAULT 0,
+    FOREIGN KEY (username) REFERENCES users(username)
+) WITHOUT ROWID"""
+
+TRANSFERS_SCHEMA = """(
+    transfer_id TEXT PRIMARY KEY,
+    from_user TEXT NOT NULL,
+    to_user TEXT NOT NULL,
+    amount INTEGER NOT NULL,
+    fee INTEGER NOT NULL,
+    reference TEXT,
+    status TEXT NOT NULL,
+    reason TEXT,
+    created_at INTEGER,
+    updated_at INTEGER,
+    FOREIGN KEY (from_user) REFERENCES accounts(username),
+    FOREIGN KEY (to_user) REFERENCES accounts(username)
+)"""
+
+AUDIT_LOGS_SCHEMA = """(
+    log_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    operation TEXT NOT NULL,
+    username TEXT,
+    details TEXT,
+    timestamp INTEGER
+)"""
+
+# SQL expression converting a legacy TEXT money column to integer cents
+_CENTS_FROM_TEXT = "CAST(ROUND(CAST({} AS REAL) * 100) AS INTEGER)"
+
+
+
+def _column_types(cursor: sqlite3.Cursor, table: str) -> Dict[str, str]:
+    """Map column name -> declared type for a table."""
+    cursor.execute(f"PRAGMA table_info({table})")
+    return {col["name"]: col["type"].upper() for col in cursor.fetchall()}
+
+
+def _is_without_rowid(cursor: sqlite3.Cursor, table: str) -> bool:
+    """Whether table was created WITHOUT ROWID."""
+    cursor.execute("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = ?", (table,))
+    return "WITHOUT ROWID" in cursor.fetchone()[0].upper()
+
+
+def _rebuild_table(cursor: sqlite3.Cursor, table: str, schema: str, select: str) -> None:
+    """
+    Recreate table with a new schema, copying rows through the select
+    expressions, in one transaction. Indexes on the table are dropped with
+    it and must be recreated by the caller.
+    """
+    if not cursor.connection.in_transaction:
+        cursor.execute("BEGIN")
+    cursor.execute(f"CREATE TABLE {table}_new {schema}")
+    cursor.execute(f"INSERT INTO {table}_new SELECT {select} FROM {table}")
+    cursor.execute(f"DROP TABLE {table}")
+    cursor.execute(f"ALTER TABLE {table}_new RENAME TO {table}")
+
 
 @contextmanager
 def get_db():
-    """Context manager for database connections."""
-    conn = sqlite3.connect(DATABASE_FILE)
-    conn.row_factory = sqlite3.Row  # Return rows as dicts
+    """
+    Context manager for this thread's database connection, opened on first
+    use; commits on success and rolls back on error. Not reentrant: nested
+    blocks on one thread share a transaction.
+    """
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        conn = _local.conn = _connect()
     try:
         yield conn
         conn.commit()
     except Exception:
         conn.rollback()
         raise
-    finally:
-        conn.close()
 
 
 @Pyro5.api.expose
@@ -45,68 +294,102 @@ class BankDatabaseServer:
 
     def __init__(self):
         """Initialize database and create tables if needed."""
+        if sqlite3.sqlite_version_info < MIN_SQLITE_VERSION:
+            raise RuntimeError(
+                f"BDB needs SQLite >= {'.'.join(map(str, MIN_SQLITE_VERSION))}, "
+                f"found {sqlite3.sqlite_version}"
+            )
+        # username -> raw SHA-256 password digest, filled on first login
+        self._pwd_cache: Dict[str, bytes] = {}
+        # username -> (get_user result, expiry on time.monotonic()), in
+        # insertion order, which with one TTL is also expiry order
+        self._user_cache: Dict[str, Tuple[Dict[str, Any], float]] = {}
+        self._user_lock = threading.Lock()
         self.init_database()
+        _start_audit_writer()
 
     def init_database(self):
         """Initialize SQLite database with required tables."""
         with get_db() as conn:
             cursor = conn.cursor()
 
+            # WAL lets readers run alongside the writer
+            cursor.execute("PRAGMA journal_mode=WAL")
+
             # Users table: stores user credentials
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS users (
-                    username TEXT PRIMARY KEY,
-                    password_hash TEXT NOT NULL,
-                    email TEXT,
-                    created_at INTEGER
-                )
-            """)
+            cursor.execute(f"CREATE TABLE IF NOT EXISTS users {USERS_SCHEMA}")
 
             # Accounts table: stores account information
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS accounts (
-                    username TEXT PRIMARY KEY,
-                    balance TEXT NOT NULL,
-                    created_at INTEGER,
-                    FOREIGN KEY (username) REFERENCES users(username)
-                )
-            """)
+            cursor.execute(f"CREATE TABLE IF NOT EXISTS accounts {ACCOUNTS_SCHEMA}")
 
             # Transfers table: stores transfer records
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS transfers (
-                    transfer_id TEXT PRIMARY KEY,
-                    from_user TEXT NOT NULL,
-                    to_user TEXT NOT NULL,
-                    amount TEXT NOT NULL,
-                    fee TEXT NOT NULL,
-                    reference TEXT,
-                    status TEXT NOT NULL,
-                    reason TEXT,
-                    created_at INTEGER,
-                    updated_at INTEGER,
-                    FOREIGN KEY (from_user) REFERENCES accounts(username),
-                    FOREIGN KEY (to_user) REFERENCES accounts(username)
-                )
-            """)
+            cursor.execute(f"CREATE TABLE IF NOT EXISTS transfers {TRANSFERS_SCHEMA}")
 
             # Audit logs table: stores all operations for audit trail
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS audit_logs (
-                    log_id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    operation TEXT NOT NULL,
-                    username TEXT,
-                    details TEXT,
-                    timestamp INTEGER
+            cursor.execute(f"CREATE TABLE IF NOT EXISTS audit_logs {AUDIT_LOGS_SCHEMA}")
+
+            # Older databases predate the account version column
+            columns = _column_types(cursor, "accounts")
+            if "version" not in columns:
+                cursor.execute(
+                    "ALTER TABLE accounts ADD COLUMN version INTEGER NOT NULL DEFAULT 0"
+                )
+
+            # Older databases store money as TEXT ("1234.50"); TEXT affinity
+            # would turn integers back into text, so rebuild as INTEGER cents
+            if columns["balance"] == "TEXT":
+                _rebuild_table(
+                    cursor, "accounts", ACCOUNTS_SCHEMA,
+                    f"username, {_CENTS_FROM_TEXT.format('balance')}, created_at, version",
+                )
+            if _column_types(cursor, "transfers")["amount"] == "TEXT":
+                _rebuild_table(
+                    cursor, "transfers", TRANSFERS_SCHEMA,
+                    "transfer_id, from_user, to_user, "
+                    f"{_CENTS_FROM_TEXT.format('amount')}, {_CENTS_FROM_TEXT.format('fee')}, "
+                    "reference, status, reason, created_at, updated_at",
+                )
+
+            # Older databases keep users/accounts in rowid tables; the
+            # rebuild above already covers accounts when it ran
+            if not _is_without_rowid(cursor, "accounts"):
+                _rebuild_table(
+                    cursor, "accounts", ACCOUNTS_SCHEMA, "username, balance, created_at, version"
+                )
+            if not _is_without_rowid(cursor, "users"):
+                _rebuild_table(
+                    cursor, "users", USERS_SCHEMA, "username, password_hash, email, created_at"
                 )
-            """)
 
-            conn.commit()
+            # Indexes for per-user transfer history and recent audit logs
+            cursor.execute(
+                "CREATE INDEX IF NOT EXISTS idx_transfers_from ON transfers(from_user, created_at DESC)"
+            )
+            cursor.execute(
+                "CREATE INDEX IF NOT EXISTS idx_transfers_to ON transfers(to_user, created_at DESC)"
+            )
+            cursor.execute(
+                "CREATE INDEX IF NOT EXISTS idx_audit_ts ON audit_logs(timestamp DESC)"
+            )
+
+            # Older databases store password hashes as hex text; convert
+            # them to raw 32-byte digests
+            cursor.execute(
+                "SELECT username, password_hash FROM users WHERE typeof(password_hash) = 'text'"
+            )
+            hex_rows = cursor.fetchall()
+            if hex_rows:
+                cursor.executemany(
+                    "UPDATE users SET password_hash = ? WHERE username = ?",
+                    [(bytes.fromhex(row["password_hash"]), row["username"]) for row in hex_rows],
+                )
 
-            # Initialize mock users if they don't exist
             cursor.execute("SELECT COUNT(*) FROM users")
-            if cursor.fetchone()[0] == 0:
-                self._init_mock_users()
+            needs_mock_users = cursor.fetchone()[0] == 0
+
+        # Initialize mock users if they don't exist (in its own transaction)
+        if needs_mock_users:
+            self._init_mock_users()
 
     def _init_mock_users(self):
         """Initialize with mock users for testing."""
@@ -115,92 +398,106 @@ class BankDatabaseServer:
             "bob": "bob123",
         }
         mock_balances = {
-            "alice": "50000.00",
-            "bob": "1000.00",
+            "alice": 5000000,  # cents
+            "bob": 100000,
         }
 
+        current_time = int(time.time())
+        users_rows = [
+            # Hash password (simple hash for demo)
+            (username, hashlib.sha256(password.encode()).digest(), current_time)
+            for username, password in mock_users.items()
+        ]
+        accounts_rows = [
+            (username, mock_balances[username], current_time) for username in mock_users
+        ]
+
         with get_db() as conn:
             cursor = conn.cursor()
-            current_time = int(time.time())
-
-            for username, password in mock_users.items():
-                # Hash password (simple hash for demo)
-                pwd_hash = hashlib.sha256(password.encode()).hexdigest()
-
-                # Insert user
-                cursor.execute(
-                    "INSERT INTO users (username, password_hash, created_at) VALUES (?, ?, ?)",
-                    (username, pwd_hash, current_time),
-                )
-
-                # Insert account
-                cursor.execute(
-                    "INSERT INTO accounts (username, balance, created_at) VALUES (?, ?, ?)",
-                    (username, mock_balances[username], current_time),
-                )
-
-                # Log
-                cursor.execute(
-                    "INSERT INTO audit_logs (operation, username, details, timestamp) VALUES (?, ?, ?, ?)",
-                    ("USER_CREATED", username, "Mock user initialized", current_time),
-                )
+            cursor.executemany(
+                "INSERT INTO users (username, password_hash, created_at) VALUES (?, ?, ?)",
+                users_rows,
+            )
+            cursor.executemany(
+                "INSERT INTO accounts (username, balance, created_at) VALUES (?, ?, ?)",
+                accounts_rows,
+            )
 
-            conn.commit()
+        for username in mock_users:
+            AUDIT_QUEUE.put(("USER_CREATED", username, "Mock user initialized", current_time))
 
     # ---------- User operations ----------
 
     def get_user(self, username: str) -> Dict[str, Any]:
-        """Get user record."""
+        """Get user record ({} if missing), cached for USER_CACHE_TTL seconds."""
+        now = time.monotonic()
+        cached = self._user_cache.get(username)
+        if cached is not None and cached[1] > now:
+            return cached[0]
+
         with get_db() as conn:
             cursor = conn.cursor()
             cursor.execute("SELECT * FROM users WHERE username = ?", (username,))
             row = cursor.fetchone()
 
-            if row:
-                return {
-                    "username": row["username"],
-                    "email": row["email"],
-                    "created_at": row["created_at"],
-                }
-            return {}
+        user: Dict[str, Any] = {}
+        if row:
+            user = {
+                "username": row["username"],
+                "email": row["email"],
+                "created_at": row["created_at"],
+            }
+        cache = self._user_cache
+        with self._user_lock:
+            cache.pop(username, None)  # re-insert at the end
+            # Drop expired entries from the front, then the oldest if full
+            while cache:
+                oldest = next(iter(cache))
+                if cache[oldest][1] > now and len(cache) < USER_CACHE_SIZE:
+                    break
+                del cache[oldest]
+            cache[username] = (user, now + USER_CACHE_TTL)
+        return user
+
+    def user_exists(self, username: str) -> bool:
+        """Check whether a user exists (served from the get_user cache)."""
+        return bool(self.get_user(username))
 
     def verify_user(self, username: str, password: str) -> bool:
         """Verify user credentials."""
-        pwd_hash = hashlib.sha256(password.encode()).hexdigest()
+        pwd_hash = hashlib.sha256(password.encode()).digest()
 
-        with get_db() as conn:
-            cursor = conn.cursor()
-            cursor.execute(
-                "SELECT password_hash FROM users WHERE username = ?", (username,)
-            )
-            row = cursor.fetchone()
-
-            if row and row["password_hash"] == pwd_hash:
-                # Log login attempt
+        stored = self._pwd_cache.get(username)
+        if stored is None:
+            with get_db() as conn:
+                cursor = conn.cursor()
                 cursor.execute(
-                    "INSERT INTO audit_logs (operation, username, timestamp) VALUES (?, ?, ?)",
-                    ("LOGIN_SUCCESS", username, int(time.time())),
+                    "SELECT password_hash FROM users WHERE username = ?", (username,)
                 )
-                conn.commit()
-                return True
+                row = cursor.fetchone()
+            if row:
+                stored = row["password_hash"]
+                self._pwd_cache[username] = stored
 
-            # Log failed login
-            if username:  # Only log if username was provided
-                cursor.execute(
-                    "INSERT INTO audit_logs (operation, username, timestamp) VALUES (?, ?, ?)",
-                    ("LOGIN_FAILED", username, int(time.time())),
-                )
-                conn.commit()
-            return False
+        if stored is not None and hmac.compare_digest(stored, pwd_hash):
+            # Log login attempt
+            AUDIT_QUEUE.put(("LOGIN_SUCCESS", username, None, int(time.time())))
+            return True
+
+        # Log failed login
+        if username:  # Only log if username was provided
+            AUDIT_QUEUE.put(("LOGIN_FAILED", username, None, int(time.time())))
+        return False
 
     def create_user(self, username: str, password: str, email: str = "") -> bool:
         """Create a new user."""
-        pwd_hash = hashlib.sha256(password.encode()).hexdigest()
+        pwd_hash = hashlib.sha256(password.encode()).digest()
         current_time = int(time.time())
 
-        with get_db() as conn:
-            cursor = conn.cursor()
-            try:
+        try:
+            # Both rows commit together; get_db rolls back if either fails
+            with get_db() as conn:
+                cursor = conn.cursor()
                 cursor.execute(
                     "INSERT INTO users (username, password_hash, email, created_at) VALUES (?, ?, ?, ?)",
                     (username, pwd_hash, email, current_time),
@@ -209,19 +506,16 @@ class BankDatabaseServer:
                 # Create associated account
                 cursor.execute(
                     "INSERT INTO accounts (username, balance, created_at) VALUES (?, ?, ?)",
-                    (username, "0.00", current_time),
+                    (username, 0, current_time),
                 )
+        except sqlite3.IntegrityError:
+            return False  # User already exists
 
-                # Log
-                cursor.execute(
-                    "INSERT INTO audit_logs (operation, username, details, timestamp) VALUES (?, ?, ?, ?)",
-                    ("USER_CREATED", username, f"Email: {email}", current_time),
-                )
-
-                conn.commit()
-                return True
-            except sqlite3.IntegrityError:
-                return False  # User already exists
+        self._pwd_cache.pop(username, None)
+        with self._user_lock:
+            self._user_cache.pop(username, None)
+        AUDIT_QUEUE.put(("USER_CREATED", username, f"Email: {email}", current_time))
+        return True
 
     # ---------- Account/Balance operations ----------
 
@@ -233,165 +527,313 @@ class BankDatabaseServer:
             row = cursor.fetchone()
 
             if row:
-                return row["balance"]
+                return from_cents(row["balance"])
             return None
 
-    def update_balance(self, username: str, new_balance: str) -> bool:
-        """Update account balance for user."""
-        new_balance = str(money(new_balance))  # Ensure proper decimal formatting
-        current_time = int(time.time())
-
+    def get_balance_version(self, username: str) -> Optional[Tuple[str, int]]:
+        """Get account balance together with its version (bumped on every write)."""
         with get_db() as conn:
             cursor = conn.cursor()
             cursor.execute(
-                "UPDATE accounts SET balance = ? WHERE username = ?",
-                (new_balance, username),
+                "SELECT balance, version FROM accounts WHERE username = ?", (username,)
             )
+            row = cursor.fetchone()
 
-            # Log balance change
+            if row:
+                return from_cents(row["balance"]), row["version"]
+            return None
+
+    def update_balance(
+        self,
+        username: str,
+        new_balance: str,
+        expected_version: Optional[int] = None,
+        already_quantized: bool = False,
+    ) -> Optional[str]:
+        """
+        Update account balance for user; returns the stored balance, or None
+        if nothing was updated.
+
+        If expected_version is given the write only succeeds when the account
+        is still at that version (compare-and-swap); None means the caller
+        should re-read and retry. Pass already_quantized=True when
+        new_balance is already a str(money(...)) value.
+        """
+        # Stored as integer cents
+        cents = to_cents(new_balance) if already_quantized else money_cents(new_balance)
+        current_time = int(time.time())
+
+        with get_db() as conn:
+            cursor = conn.cursor()
             cursor.execute(
-                "INSERT INTO audit_logs (operation, username, details, timestamp) VALUES (?, ?, ?, ?)",
-                (
-                    "BALANCE_UPDATED",
-                    username,
-                    f"New balance: {new_balance}",
-                    current_time,
-                ),
+                "UPDATE accounts SET balance = :balance, version = version + 1 "
+                "WHERE username = :username AND (:version IS NULL OR version = :version) "
+                "RETURNING balance",
+                {"balance": cents, "username": username, "version": expected_version},
             )
+            row = cursor.fetchone()
+            if row is None:
+                return None
 
-            conn.commit()
-            return cursor.rowcount > 0
+        balance = from_cents(row["balance"])
+        AUDIT_QUEUE.put(("BALANCE_UPDATED", username, f"New balance: {balance}", current_time))
+        return balance
 
     # ---------- Transfer operations ----------
 
-    def create_transfer(self, transfer_record: Dict[str, Any]) -> bool:
-        """Create a transfer record."""
+    def create_transfer(self, transfer_record: Union[Dict[str, Any], TransferRecord]) -> bool:
+        """Create a transfer record (API dict or TransferRecord)."""
         try:
+            if not isinstance(transfer_record, TransferRecord):
+                transfer_record = TransferRecord.from_dict(transfer_record)
             with get_db() as conn:
                 cursor = conn.cursor()
-                cursor.execute(
-                    """INSERT INTO transfers 
-                    (transfer_id, from_user, to_user, amount, fee, reference, status, reason, created_at, updated_at)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
-                    (
-                        transfer_record["transfer_id"],
-                        transfer_record["from"],
-                        transfer_record["to"],
-                        transfer_record["amount"],
-                        transfer_record["fee"],
-                        transfer_record.get("reference", ""),
-                        transfer_record["status"],
-                        transfer_record.get("reason", ""),
-                        transfer_record["created_at"],
-                        transfer_record["updated_at"],
-                    ),
-                )
+                audit = self._insert_transfer(cursor, transfer_record)
+        except Exception:
+            return False
 
-                # Log transfer
-                cursor.execute(
-                    "INSERT INTO audit_logs (operation, username, details, timestamp) VALUES (?, ?, ?, ?)",
-                    (
-                        "TRANSFER_CREATED",
-                        transfer_record["from"],
-                        f"Transfer {transfer_record['transfer_id']} to {transfer_record['to']}: ${transfer_record['amount']}",
-                        int(time.time()),
-                    ),
+        AUDIT_QUEUE.put(audit)
+        return True
+
+    def _insert_transfer(self, cursor: sqlite3.Cursor, record: TransferRecord) -> AuditEntry:
+        """Insert a transfer row; returns its audit entry to queue after commit."""
+        cursor.execute(
+            f"INSERT INTO transfers ({TRANSFER_COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            record.as_row(),
+        )
+        return (
+            "TRANSFER_CREATED",
+            record.from_user,
+            f"Transfer {record.transfer_id} to {record.to_user}: ${record.amount}",
+            record.created_at,
+        )
+
+    def execute_transfer(
+        self,
+        from_user: str,
+        to_user: str,
+        amount_cents: int,
+        fee_cents: int,
+        transfer_id: str,
+        reference: str = "",
+    ) -> Dict[str, Any]:
+        """
+        Validate and apply a transfer in a single atomic transaction.
+
+        Checks both accounts, debits the sender (amount + fee), credits the
+        recipient (amount) and stores the transfer record. Insufficient funds
+        are recorded as a FAILED transfer. Amounts are integer cents.
+
+        The transaction starts with BEGIN IMMEDIATE, so the balances it reads
+        cannot change before its UPDATEs run. If the write lock is still held
+        elsewhere after busy_timeout, {"ok": False, "retry": True} tells the
+        caller to try again.
+        """
+        if amount_cents <= 0 or fee_cents < 0:
+            return {"ok": False, "error": "Invalid amount"}
+        if from_user == to_user:
+            # The CASE update below would only apply the debit
+            return {"ok": False, "error": "Recipient cannot be the sender"}
+        current_time = int(time.time())
+
+        audit: List[AuditEntry] = []
+        try:
+            with get_db() as conn:
+                conn.execute("BEGIN IMMEDIATE")
+                res = self._apply_transfer(
+                    conn.cursor(), from_user, to_user, amount_cents, fee_cents,
+                    transfer_id, reference, current_time, audit,
                 )
+        except sqlite3.OperationalError as e:
+            if "locked" not in str(e):
+                raise
+            return {"ok": False, "error": "Database busy", "retry": True}
+
+        # Only committed transfers reach the audit log; the writer thread
+        # inserts these together in one batch
+        for entry in audit:
+            AUDIT_QUEUE.put(entry)
+        return res
+
+    def _apply_transfer(
+        self,
+        cursor: sqlite3.Cursor,
+        sender: str,
+        recipient: str,
+        amount: int,
+        fee: int,
+        transfer_id: str,
+        reference: str,
+        current_time: int,
+        audit: List[AuditEntry],
+    ) -> Dict[str, Any]:
+        """
+        Body of execute_transfer, run under the write lock. Audit entries
+        are appended to audit for the caller to queue.
+        """
+        # Fetch both accounts in one query
+        cursor.execute(
+            "SELECT username, balance, version FROM accounts WHERE username IN (?, ?)",
+            (sender, recipient),
+        )
+        rows = {row["username"]: row for row in cursor.fetchall()}
+
+        recipient_row = rows.get(recipient)
+        if recipient_row is None:
+            return {"ok": False, "error": "Invalid recipient account"}
+
+        sender_row = rows.get(sender)
+        if sender_row is None:
+            return {"ok": False, "error": "Sender account not found"}
+
+        if sender_row["balance"] < amount + fee:
+            status, reason = "FAILED", "Insufficient funds"
+        else:
+            status, reason = "COMPLETED", ""
+            # Debit and credit both accounts in one statement
+            cursor.execute(
+                "UPDATE accounts SET "
+                "balance = balance + CASE username WHEN :sender THEN -:total ELSE :amount END, "
+                "version = version + 1 "
+                "WHERE username IN (:sender, :recipient) "
+                "RETURNING username, balance, version",
+                {"sender": sender, "recipient": recipient, "total": amount + fee, "amount": amount},
+            )
+            rows = {row["username"]: row for row in cursor.fetchall()}
+            sender_row, recipient_row = rows[sender], rows[recipient]
 
-                conn.commit()
-                return True
-        except Exception:
-            return False
+            audit += [
+                ("BALANCE_UPDATED", sender, f"New balance: {from_cents(sender_row['balance'])}", current_time),
+                ("BALANCE_UPDATED", recipient, f"New balance: {from_cents(recipient_row['balance'])}", current_time),
+            ]
+
+        audit.append(self._insert_transfer(
+            cursor,
+            TransferRecord(
+                transfer_id, sender, recipient, from_cents(amount), from_cents(fee), reference,
+                status, reason, current_time, current_time,
+            ),
+        ))
+
+        if status == "FAILED":
+            return {"ok": False, "error": reason, "transfer_id": transfer_id}
+        return {
+            "ok": True,
+            "new_sender_balance": from_cents(sender_row["balance"]),
+            "sender_version": sender_row["version"],
+            "new_recipient_balance": from_cents(recipient_row["balance"]),
+            "recipient_version": recipient_row["version"],
+            "error": "",
+        }
 
     def get_transfer(self, transfer_id: str) -> Optional[Dict[str, Any]]:
         """Get transfer record by ID."""
         with get_db() as conn:
-            cursor = conn.cursor()
-            cursor.execute("SELECT * FROM transfers WHERE transfer_id = ?", (transfer_id,))
+            cursor = _tuple_cursor(conn)
+            cursor.execute(
+                f"SELECT {TRANSFER_COLUMNS} FROM transfers WHERE transfer_id = ?", (transfer_id,)
+            )
             row = cursor.fetchone()
 
             if row:
-                return {
-                    "transfer_id": row["transfer_id"],
-                    "from": row["from_user"],
-                    "to": row["to_user"],
-                    "amount": row["amount"],
-                    "fee": row["fee"],
-                    "reference": row["reference"],
-                    "status": row["status"],
-                    "reason": row["reason"],
-                    "created_at": row["created_at"],
-                    "updated_at": row["updated_at"],
-                }
+                return TransferRecord.from_row(row).to_dict()
             return None
 
-    def update_transfer(self, transfer_id: str, status: str, reason: str = "") -> bool:
-        """Update transfer status."""
+    def update_transfer(self, transfer_id: str, status: str, reason: str = "") -> Optional[Dict[str, Any]]:
+        """Update transfer status; returns the updated transfer, or None if not found."""
         current_time = int(time.time())
 
         with get_db() as conn:
-            cursor = conn.cursor()
+            cursor = _tuple_cursor(conn)
             cursor.execute(
-                "UPDATE transfers SET status = ?, reason = ?, updated_at = ? WHERE transfer_id = ?",
+                "UPDATE transfers SET status = ?, reason = ?, updated_at = ? WHERE transfer_id = ? "
+                f"RETURNING {TRANSFER_COLUMNS}",
                 (status, reason, current_time, transfer_id),
             )
+            row = cursor.fetchone()
+            if row is None:
+                return None
 
-            # Log update
-            cursor.execute(
-                "INSERT INTO audit_logs (operation, username, details, timestamp) VALUES (?, ?, ?, ?)",
-                ("TRANSFER_UPDATED", "", f"Transfer {transfer_id} status: {status}", current_time),
-            )
-
-            conn.commit()
-            return cursor.rowcount > 0
+        AUDIT_QUEUE.put(("TRANSFER_UPDATED", "", f"Transfer {transfer_id} status: {status}", current_time))
+        return TransferRecord.from_row(row).to_dict()
 
     def get_transfers_by_user(self, username: str) -> List[Dict[str, Any]]:
-        """Get all transfers for a user (both sent and received)."""
+        """
+        Get all transfers for a user (both sent and received).
+
+        Deprecated: returns the whole history in one reply; use
+        get_transfers_page instead.
+        """
         with get_db() as conn:
-            cursor = conn.cursor()
+            cursor = _tuple_cursor(conn)
+            # One SELECT per index instead of an OR, which would force a
+            # full scan; the second branch skips self-transfers already
+            # returned by the first. Rows come back as JSON built by SQLite;
+            # created_at is also selected because a compound SELECT can only
+            # be ordered by a result column.
             cursor.execute(
-                "SELECT * FROM transfers WHERE from_user = ? OR to_user = ? ORDER BY created_at DESC",
-                (username, username),
+                f"SELECT created_at, {TRANSFER_JSON} FROM transfers WHERE from_user = ? "
+                "UNION ALL "
+                f"SELECT created_at, {TRANSFER_JSON} FROM transfers WHERE to_user = ? AND from_user != ? "
+                "ORDER BY created_at DESC",
+                (username, username, username),
             )
-            rows = cursor.fetchall()
-
-            return [
-                {
-                    "transfer_id": row["transfer_id"],
-                    "from": row["from_user"],
-                    "to": row["to_user"],
-                    "amount": row["amount"],
-                    "fee": row["fee"],
-                    "reference": row["reference"],
-                    "status": row["status"],
-                    "reason": row["reason"],
-                    "created_at": row["created_at"],
-                    "updated_at": row["updated_at"],
-                }
-                for row in rows
-            ]
+            return _json_rows(cursor.fetchall(), 1)
+
+    def get_transfers_page(
+        self,
+        username: str,
+        before_created_at: Optional[int] = None,
+        limit: int = 50,
+        before_transfer_id: str = "",
+    ) -> List[Dict[str, Any]]:
+        """
+        Get one page of a user's transfers, newest first.
+
+        Pass the created_at and transfer_id of the last transfer on the
+        previous page to get the next one; an empty list means there are no
+        more. limit is capped at MAX_TRANSFER_PAGE.
+        """
+        limit = max(1, min(limit, MAX_TRANSFER_PAGE))
+        # Keyset: everything strictly after (created_at, transfer_id) in
+        # descending order. Ties on created_at are common, hence transfer_id.
+        params = {
+            "user": username,
+            "ts": before_created_at if before_created_at is not None else 2**63 - 1,
+            "tid": before_transfer_id if before_created_at is not None else "",
+            "limit": limit,
+        }
+        with get_db() as conn:
+            cursor = _tuple_cursor(conn)
+            # Each branch seeks its own index and stops after one page
+            cursor.execute(
+                "SELECT * FROM ("
+                f"  SELECT created_at, transfer_id, {TRANSFER_JSON} FROM transfers"
+                "   WHERE from_user = :user AND (created_at, transfer_id) < (:ts, :tid)"
+                "   ORDER BY created_at DESC, transfer_id DESC LIMIT :limit"
+                ") UNION ALL SELECT * FROM ("
+                f"  SELECT created_at, transfer_id, {TRANSFER_JSON} FROM transfers"
+                "   WHERE to_user = :user AND from_user != :user"
+                "   AND (created_at, transfer_id) < (:ts, :tid)"
+                "   ORDER BY created_at DESC, transfer_id DESC LIMIT :limit"
+                ") ORDER BY created_at DESC, transfer_id DESC LIMIT :limit",
+                params,
+            )
+            return _json_rows(cursor.fetchall(), 2)
 
     # ---------- Audit operations ----------
 
     def get_audit_logs(self, limit: int = 100) -> List[Dict[str, Any]]:
         """Get recent audit logs."""
         with get_db() as conn:
-            cursor = conn.cursor()
+            cursor = _tuple_cursor(conn)
             cursor.execute(
-                "SELECT * FROM audit_logs ORDER BY timestamp DESC LIMIT ?", (limit,)
+                "SELECT json_object('log_id', log_id, 'operation', operation, 'username', username, "
+                "'details', details, 'timestamp', timestamp) "
+                "FROM audit_logs ORDER BY timestamp DESC LIMIT ?",
+                (limit,),
             )
-            rows = cursor.fetchall()
-
-            return [
-                {
-                    "log_id": row["log_id"],
-                    "operation": row["operation"],
-                    "username": row["username"],
-                    "details": row["details"],
-                    "timestamp": row["timestamp"],
-                }
-                for row in rows
-            ]
+            return _json_rows(cursor.fetchall())
 
     def health_check(self) -> Dict[str, str]:
         """Health check endpoint."""
@@ -404,6 +846,12 @@ def main():
     # if os.path.exists(DATABASE_FILE):
     #     os.remove(DATABASE_FILE)
 
+    # Pool of worker threads, each reusing its own SQLite connection;
+    # WAL lets their reads run in parallel while writes serialize in SQLite
+    Pyro5.config.SERVERTYPE = "thread"
+    Pyro5.config.THREADPOOL_SIZE = THREADPOOL_SIZE
+    Pyro5.config.THREADPOOL_SIZE_MIN = THREADPOOL_MIN
+
     daemon = Pyro5.api.Daemon(host="127.0.0.1", port=9091)
     uri = daemon.register(BankDatabaseServer(), objectId="BDB")
 
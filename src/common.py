@@ -1,15 +1,133 @@
 from __future__ import annotations
 from dataclasses import dataclass
 from decimal import Decimal, ROUND_HALF_UP
-import uuid
+from functools import lru_cache
+from typing import Any, Callable, Dict, List, Sequence
+import re
 
 MONEY_Q = Decimal("0.01")
 
+# BAS daemon worker threads. Each BAS worker keeps its own BDB proxy open,
+# so BDB's pool is sized from this (see bdb_server.THREADPOOL_SIZE).
+BAS_THREADPOOL_SIZE = 64
+
+# Plain decimal notation: sign, whole part, optional fraction. ASCII digits
+# only; \d would also match other scripts' digits, which int() accepts but
+# the frac[2:3] >= "5" rounding check compares by code point.
+_MONEY_RE = re.compile(r"(-?)([0-9]+)(?:\.([0-9]*))?")
+
+# Money is stored as SQLite INTEGER cents, a signed 64-bit value; larger
+# amounts also exceed the 28 digits money() can return exactly
+MAX_CENTS = 2**63 - 1
+
+def money_cents(x: str | int | float | Decimal) -> int:
+    """
+    Parse a money value into integer cents, rounding half up (away from
+    zero) like money(). Plain "123.456"-style strings are handled without
+    Decimal; anything else (exponents, "+5", ".5", ...) falls back to it.
+    Raises ValueError beyond MAX_CENTS either way.
+    """
+    if type(x) is int:
+        cents = x * 100
+    else:
+        m = _MONEY_RE.fullmatch(str(x).strip())
+        if m is None:
+            d = Decimal(str(x))
+            if not d.is_finite() or d.adjusted() > 18:
+                raise ValueError(f"Amount out of range: {x!r}")
+            cents = int(d.quantize(MONEY_Q, rounding=ROUND_HALF_UP).scaleb(2))
+        else:
+            sign, whole, frac = m.groups()
+            frac = frac or ""
+            cents = int(whole) * 100 + int(frac[:2].ljust(2, "0"))
+            if frac[2:3] >= "5":
+                cents += 1
+            if sign:
+                cents = -cents
+    if abs(cents) > MAX_CENTS:
+        raise ValueError(f"Amount out of range: {x!r}")
+    return cents
+
+# Transfers repeat the same few amounts; Decimal results are immutable so
+# they can be shared between callers. typed: the float 2.675 and
+# Decimal(2.675) are equal but round differently.
+@lru_cache(maxsize=1024, typed=True)
 def money(x: str | int | float | Decimal) -> Decimal:
-    return Decimal(str(x)).quantize(MONEY_Q, rounding=ROUND_HALF_UP)
+    return Decimal(money_cents(x)).scaleb(-2)
+
+# Canonical money string as produced by str(money(x)), e.g. "1234.50"
+_CANONICAL_RE = re.compile(r"-?[0-9]+\.[0-9]{2}")
+
+def to_cents(s: str) -> int:
+    """Parse a canonical two-decimal money string into integer cents."""
+    if _CANONICAL_RE.fullmatch(s) is None:
+        raise ValueError(f"Not a canonical money string: {s!r}")
+    return int(s.replace(".", ""))
+
+def from_cents(c: int) -> str:
+    """Format integer cents as a canonical two-decimal money string."""
+    sign = "-" if c < 0 else ""
+    whole, frac = divmod(abs(c), 100)
+    return f"{sign}{whole}.{frac:02d}"
+
+@dataclass(slots=True)
+class TransferRecord:
+    """
+    One transfer, in the column order of the BDB transfers table.
 
-def new_id(prefix: str) -> str:
-    return f"{prefix}_{uuid.uuid4().hex[:12]}"
+    Pyro carries transfers as plain dicts with "from"/"to" keys; use
+    from_dict()/to_dict() at that boundary. amount and fee are money
+    strings here but integer cents in the database; use from_row()/as_row()
+    there.
+    """
+    transfer_id: str
+    from_user: str
+    to_user: str
+    amount: str
+    fee: str
+    reference: str
+    status: str
+    reason: str
+    created_at: int
+    updated_at: int
+
+    @classmethod
+    def from_dict(cls, d: Dict[str, Any]) -> TransferRecord:
+        return cls(
+            d["transfer_id"], d["from"], d["to"], d["amount"], d["fee"],
+            d.get("reference", ""), d["status"], d.get("reason", ""),
+            d["created_at"], d["updated_at"],
+        )
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "transfer_id": self.transfer_id,
+            "from": self.from_user,
+            "to": self.to_user,
+            "amount": self.amount,
+            "fee": self.fee,
+            "reference": self.reference,
+            "status": self.status,
+            "reason": self.reason,
+            "created_at": self.created_at,
+            "updated_at": self.updated_at,
+        }
+
+    @classmethod
+    def from_row(cls, row: Sequence[Any]) -> TransferRecord:
+        (transfer_id, from_user, to_user, amount, fee,
+         reference, status, reason, created_at, updated_at) = row
+        return cls(
+            transfer_id, from_user, to_user, from_cents(amount), from_cents(fee),
+            reference, status, reason, created_at, updated_at,
+        )
+
+    def as_row(self) -> tuple:
+        return (
+            self.transfer_id, self.from_user, self.to_user,
+            money_cents(self.amount), money_cents(self.fee),
+            self.reference, self.status, self.reason, self.created_at, self.updated_at,
+        )
 
 @dataclass(frozen=True)
 class FeeRule:
@@ -33,19 +151,46 @@ FEE_RULES = [
     FeeRule(money("100000.00"), None,               Decimal("0.0005"),  money("100.00")),
 ]
 
+# FEE_RULES flattened to integer cents: upper tier bounds, percentages in
+# units of 1/100000, and caps (None = uncapped)
+_FEE_PCT_SCALE = 100000
+_FEE_BOUNDS_CENTS = [to_cents(str(r.max_inclusive)) for r in FEE_RULES if r.max_inclusive is not None]
+_FEE_PCT = [int(r.pct * _FEE_PCT_SCALE) for r in FEE_RULES]
+_FEE_CAPS_CENTS = [to_cents(str(r.cap)) if r.cap is not None else None for r in FEE_RULES]
+
+def _fee_source() -> str:
+    """
+    Source of fee_cents() with the tiers above inlined as constants, one
+    comparison per tier and no lookups.
+    """
+    lines = [
+        "def fee_cents(c: int) -> int:",
+        '    """Fee in cents for an amount in cents (same tiers as compute_fee)."""',
+    ]
+    bounds: List[int | None] = [*_FEE_BOUNDS_CENTS, None]
+    for bound, pct, cap in zip(bounds, _FEE_PCT, _FEE_CAPS_CENTS):
+        indent = "        " if bound is not None else "    "
+        if bound is not None:
+            lines.append(f"    if c <= {bound}:")
+        if not pct:
+            lines.append(f"{indent}return 0")
+            continue
+        # Round half up to the cent
+        lines.append(f"{indent}f = (c * {pct} + {_FEE_PCT_SCALE // 2}) // {_FEE_PCT_SCALE}")
+        lines.append(f"{indent}return f if f < {cap} else {cap}" if cap is not None else f"{indent}return f")
+    return "\n".join(lines) + "\n"
+
+_fee_ns: Dict[str, Any] = {}
+exec(_fee_source(), _fee_ns)
+fee_cents: Callable[[int], int] = _fee_ns["fee_cents"]
+
+# Amounts cluster on round figures. typed, like money(): an equal float
+# and Decimal can parse to different cents.
+@lru_cache(maxsize=1024, typed=True)
 def compute_fee(amount: Decimal) -> Decimal:
     """
     Compute transfer fee based on tier thresholds.
-    Tiers are inclusive on lower bound, exclusive on upper bound (except last).
-    """
-    for rule in FEE_RULES:
-        # Check if amount falls within this tier
-        in_lower = amount > rule.min_exclusive
-        in_upper = rule.max_inclusive is None or amount <= rule.max_inclusive
-        
-        if in_lower and in_upper:
-            fee = (amount * rule.pct).quantize(MONEY_Q, rounding=ROUND_HALF_UP)
-            if rule.cap is not None and fee > rule.cap:
-                fee = rule.cap
-            return fee
-    return money("0.00")
+    Tiers are exclusive on lower bound, inclusive on upper bound (except last).
+    Pass amounts through money() first.
+    """
+    return Decimal(fee_cents(money_cents(amount))).scaleb(-2)
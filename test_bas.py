@@ -0,0 +1,208 @@
+"""
+BAS tests
+SessionTable put/get, expiry, discard and eviction, and BankApplicationServer
+RPCs against a stub BDB proxy.
+"""
+
+import pytest
+
+import bas_server
+from bas_server import BankApplicationServer, SessionTable
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Replace time.monotonic in bas_server with a clock the test advances."""
+    now = [1000.0]
+    monkeypatch.setattr(bas_server.time, "monotonic", lambda: now[0])
+    return now
+
+
+def test_put_get():
+    table = SessionTable()
+    table.put("tok-a", "alice")
+    table.put("tok-b", "bob")
+    assert table.get("tok-a") == "alice"
+    assert table.get("tok-b") == "bob"
+    assert table.get("tok-c") is None
+
+
+def test_put_replaces_expired_session(clock):
+    table = SessionTable(ttl=10)
+    table.put("tok-a", "alice")
+    clock[0] += 9
+    assert table.get("tok-a") == "alice"
+    clock[0] += 1
+    assert table.get("tok-a") is None
+    table.put("tok-a", "bob")
+    assert table.get("tok-a") == "bob"
+
+
+def test_discard():
+    table = SessionTable()
+    table.put("tok-a", "alice")
+    assert table.discard("tok-a")
+    assert table.get("tok-a") is None
+    assert not table.discard("tok-a")
+    assert not table.discard("never-issued")
+
+
+def test_full_window_evicts_oldest(clock):
+    """With every slot live, put() reuses the slot of the session expiring first"""
+    capacity = 8
+    assert bas_server.SESSION_PROBES >= capacity
+    table = SessionTable(capacity=capacity, ttl=60)
+    tokens = [f"tok-{i}" for i in range(capacity)]
+    for token in tokens:
+        table.put(token, token)
+        clock[0] += 1
+    table.put("tok-new", "carol")
+    assert table.get("tok-new") == "carol"
+    assert table.get(tokens[0]) is None
+    assert all(table.get(token) == token for token in tokens[1:])
+
+
+def test_capacity_must_be_power_of_two():
+    with pytest.raises(AssertionError):
+        SessionTable(capacity=6)
+
+
+class StubBDB:
+    """Stands in for the BDB proxy; records the calls BAS makes."""
+
+    def __init__(self):
+        self.transfers = {}
+        self.balances = {}  # username -> (balance, version)
+        self.transfer_result = {}
+        self.calls = []
+
+    def get_transfer(self, transfer_id):
+        self.calls.append("get_transfer")
+        return self.transfers.get(transfer_id)
+
+    def get_balance_version(self, username):
+        self.calls.append("get_balance_version")
+        return self.balances.get(username)
+
+    def execute_transfer(self, *args):
+        self.calls.append("execute_transfer")
+        return self.transfer_result
+
+
+@pytest.fixture
+def bdb():
+    return StubBDB()
+
+
+def _server(bdb, **kwargs):
+    """A BAS whose calls on this thread go to bdb."""
+    server = BankApplicationServer(**kwargs)
+    server._local.bdb = bdb
+    return server
+
+
+def _login(server, username):
+    token = server._new_token()
+    server.sessions.put(token, username)
+    return token
+
+
+def test_logout(bdb):
+    server = _server(bdb)
+    token = _login(server, "alice")
+    assert server.logout(token) == {"ok": True}
+    assert server.logout(token)["ok"] is False
+    res = server.logout(["not", "hashable"])
+    assert res["ok"] is False and res["error"].startswith("Logout error")
+
+
+def test_transfer_status_only_for_parties(bdb):
+    """Only the sender and recipient of a transfer can read it"""
+    server = _server(bdb)
+    transfer = {"transfer_id": "tr_1", "from": "alice", "to": "bob", "status": "COMPLETED"}
+    bdb.transfers["tr_1"] = transfer
+
+    for user in ("alice", "bob"):
+        assert server.get_transfer_status(_login(server, user), "tr_1") == {"ok": True, "transfer": transfer}
+    for transfer_id in ("tr_1", "tr_2"):
+        assert server.get_transfer_status(_login(server, "carol"), transfer_id) == {
+            "ok": False, "error": "Transfer not found",
+        }
+
+
+def test_transfer_amount_out_of_range(bdb):
+    """Amounts too large for 64-bit cents never reach BDB"""
+    server = _server(bdb)
+    res = server.submit_transfer(_login(server, "alice"), "bob", "1" + "0" * 20)
+    assert res == {"ok": False, "error": "Invalid amount format"}
+    assert "execute_transfer" not in bdb.calls
+
+
+def test_transfer_result_updates_balance_cache(bdb, clock):
+    """Balances returned by execute_transfer are served without asking BDB"""
+    server = _server(bdb)
+    alice, bob = _login(server, "alice"), _login(server, "bob")
+    bdb.transfer_result = {
+        "ok": True,
+        "new_sender_balance": "90.00", "sender_version": 2,
+        "new_recipient_balance": "110.00", "recipient_version": 3,
+    }
+    assert server.submit_transfer(alice, "bob", "10.00")["ok"]
+    assert server.get_balance(alice)["balance"] == "90.00"
+    assert server.get_balance(bob)["balance"] == "110.00"
+    assert "get_balance_version" not in bdb.calls
+
+
+def test_balance_cache_ignores_older_version(bdb, clock):
+    """A live entry never goes back to an older version"""
+    server = _server(bdb)
+    token = _login(server, "alice")
+    server._cache_balance("alice", "90.00", 2)
+    server._cache_balance("alice", "100.00", 1)  # reply that arrived late
+    assert server.get_balance(token)["balance"] == "90.00"
+    server._cache_balance("alice", "80.00", 3)
+    assert server.get_balance(token)["balance"] == "80.00"
+
+
+def test_balance_cache_expires(bdb, clock):
+    """Changes made outside this BAS show up after BALANCE_CACHE_TTL"""
+    server = _server(bdb)
+    token = _login(server, "alice")
+    bdb.balances["alice"] = ("100.00", 1)
+    assert server.get_balance(token)["balance"] == "100.00"
+
+    bdb.balances["alice"] = ("50.00", 2)
+    clock[0] += bas_server.BALANCE_CACHE_TTL / 2
+    assert server.get_balance(token)["balance"] == "100.00"
+    clock[0] += bas_server.BALANCE_CACHE_TTL / 2
+    assert server.get_balance(token)["balance"] == "50.00"
+    assert bdb.calls.count("get_balance_version") == 2
+
+
+def test_balance_cache_accepts_reset_version_after_expiry(bdb, clock):
+    """An expired entry is replaced even when the version went backwards"""
+    server = _server(bdb)
+    token = _login(server, "alice")
+    server._cache_balance("alice", "90.00", 7)
+    bdb.balances["alice"] = ("500.00", 0)  # database was reset
+    clock[0] += bas_server.BALANCE_CACHE_TTL
+    assert server.get_balance(token)["balance"] == "500.00"
+    # The new entry is live and moves forward from the reset version
+    server._cache_balance("alice", "400.00", 1)
+    assert server.get_balance(token)["balance"] == "400.00"
+
+
+def test_balance_cache_disabled(bdb, clock):
+    """With cache_balances=False every query goes to BDB"""
+    server = _server(bdb, cache_balances=False)
+    token = _login(server, "alice")
+    bdb.balances["alice"] = ("100.00", 1)
+    bdb.transfer_result = {
+        "ok": True,
+        "new_sender_balance": "90.00", "sender_version": 2,
+        "new_recipient_balance": "110.00", "recipient_version": 3,
+    }
+    assert server.submit_transfer(token, "bob", "10.00")["ok"]
+    assert server.get_balance(token)["balance"] == "100.00"
+    assert server.get_balance(token)["balance"] == "100.00"
+    assert bdb.calls.count("get_balance_version") == 2
@@ -0,0 +1,357 @@
+"""
+BDB tests
+Run the database server in process against a temporary DATABASE_FILE:
+schema migration, the get_user cache, execute_transfer outcomes, transfer
+paging and the audit writer.
+"""
+
+import hashlib
+import sqlite3
+import threading
+import time
+
+import pytest
+
+import bdb_server
+from bdb_server import BankDatabaseServer
+
+# Schema and data as written by the original Phase 2 BDB: TEXT money,
+# hex password hashes, rowid tables
+_BASELINE_SCHEMA = """
+CREATE TABLE users (
+    username TEXT PRIMARY KEY,
+    password_hash TEXT NOT NULL,
+    email TEXT,
+    created_at INTEGER
+);
+CREATE TABLE accounts (
+    username TEXT PRIMARY KEY,
+    balance TEXT NOT NULL,
+    created_at INTEGER,
+    FOREIGN KEY (username) REFERENCES users(username)
+);
+CREATE TABLE transfers (
+    transfer_id TEXT PRIMARY KEY,
+    from_user TEXT NOT NULL,
+    to_user TEXT NOT NULL,
+    amount TEXT NOT NULL,
+    fee TEXT NOT NULL,
+    reference TEXT,
+    status TEXT NOT NULL,
+    reason TEXT,
+    created_at INTEGER,
+    updated_at INTEGER,
+    FOREIGN KEY (from_user) REFERENCES accounts(username),
+    FOREIGN KEY (to_user) REFERENCES accounts(username)
+);
+CREATE TABLE audit_logs (
+    log_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    operation TEXT NOT NULL,
+    username TEXT,
+    details TEXT,
+    timestamp INTEGER
+);
+"""
+
+
+@pytest.fixture
+def db_file(tmp_path, monkeypatch):
+    """Point BDB at a fresh database file with fresh per-thread connections."""
+    path = tmp_path / "banking.db"
+    monkeypatch.setattr(bdb_server, "DATABASE_FILE", str(path))
+    monkeypatch.setattr(bdb_server, "_local", threading.local())
+    yield path
+    # Flush and stop the writer while it still points at this file
+    bdb_server._stop_audit_writer()
+
+
+@pytest.fixture
+def db(db_file):
+    return BankDatabaseServer()
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Shift time.monotonic forward by the seconds the test adds to clock[0]."""
+    offset = [0.0]
+    real = time.monotonic
+    monkeypatch.setattr(bdb_server.time, "monotonic", lambda: real() + offset[0])
+    return offset
+
+
+def _transfer(db, sender, recipient, amount_cents, fee_cents=0, transfer_id="tr_1"):
+    return db.execute_transfer(sender, recipient, amount_cents, fee_cents, transfer_id, "ref")
+
+
+def test_migrates_baseline_database(db_file):
+    """A database from the original schema opens with its data intact"""
+    conn = sqlite3.connect(db_file)
+    conn.executescript(_BASELINE_SCHEMA)
+    conn.executemany(
+        "INSERT INTO users VALUES (?, ?, ?, ?)",
+        [
+            ("alice", hashlib.sha256(b"alice123").hexdigest(), "a@example.com", 1),
+            ("bob", hashlib.sha256(b"bob123").hexdigest(), "", 1),
+        ],
+    )
+    conn.executemany(
+        "INSERT INTO accounts VALUES (?, ?, ?)", [("alice", "50000.00", 1), ("bob", "1000.50", 1)]
+    )
+    conn.execute(
+        "INSERT INTO transfers VALUES ('tr_old', 'alice', 'bob', '2500.00', '6.25', '', 'COMPLETED', '', 1, 1)"
+    )
+    conn.commit()
+    conn.close()
+
+    db = BankDatabaseServer()
+
+    assert db.get_balance("alice") == "50000.00"
+    assert db.get_balance("bob") == "1000.50"
+    assert db.verify_user("alice", "alice123")
+    assert not db.verify_user("alice", "wrong")
+    old = db.get_transfer("tr_old")
+    assert (old["amount"], old["fee"], old["status"]) == ("2500.00", "6.25", "COMPLETED")
+
+    assert _transfer(db, "bob", "alice", 50, transfer_id="tr_new")["ok"]
+    assert db.get_balance("bob") == "1000.00"
+
+    conn = sqlite3.connect(db_file)
+    try:
+        types = conn.execute(
+            "SELECT typeof(a.balance), typeof(u.password_hash), typeof(t.amount), typeof(t.fee)"
+            " FROM accounts a JOIN users u USING (username), transfers t"
+            " WHERE a.username = 'alice' AND t.transfer_id = 'tr_old'"
+        ).fetchone()
+        assert types == ("integer", "blob", "integer", "integer")
+        for table in ("users", "accounts"):
+            sql = conn.execute("SELECT sql FROM sqlite_master WHERE name = ?", (table,)).fetchone()[0]
+            assert "WITHOUT ROWID" in sql
+    finally:
+        conn.close()
+
+
+def test_old_sqlite_rejected(db_file, monkeypatch):
+    """BDB refuses to start on an SQLite without RETURNING"""
+    monkeypatch.setattr(bdb_server.sqlite3, "sqlite_version_info", (3, 31, 1))
+    with pytest.raises(RuntimeError, match="SQLite >= 3.35.0"):
+        BankDatabaseServer()
+
+
+def test_user_cache_missing_user_cleared_by_create(db):
+    """"No such user" is cached until create_user adds the user"""
+    assert db.get_user("carol") == {}
+    assert "carol" in db._user_cache
+    assert db.create_user("carol", "carol123", "c@example.com")
+    assert "carol" not in db._user_cache
+    assert db.get_user("carol")["email"] == "c@example.com"
+
+
+def test_user_cache_expires(db, db_file, clock):
+    """Cached users are read again after USER_CACHE_TTL"""
+    assert db.get_user("alice")["email"] is None
+    conn = sqlite3.connect(db_file)
+    with conn:
+        conn.execute("UPDATE users SET email = 'a@example.com' WHERE username = 'alice'")
+    conn.close()
+    assert db.get_user("alice")["email"] is None
+    clock[0] += bdb_server.USER_CACHE_TTL
+    assert db.get_user("alice")["email"] == "a@example.com"
+
+
+def test_user_cache_bounded(db, clock, monkeypatch):
+    """The cache keeps at most USER_CACHE_SIZE entries, dropping the oldest"""
+    monkeypatch.setattr(bdb_server, "USER_CACHE_SIZE", 4)
+    names = [f"user{i}" for i in range(10)]
+    for name in names:
+        db.get_user(name)
+        assert len(db._user_cache) <= 4
+    assert list(db._user_cache) == names[-4:]
+
+    # Once they have all expired, the next insert clears them out
+    clock[0] += bdb_server.USER_CACHE_TTL
+    db.get_user("user9")
+    assert list(db._user_cache) == ["user9"]
+
+
+def test_transfer_completed(db):
+    """Amount and fee leave the sender, the amount reaches the recipient"""
+    res = _transfer(db, "alice", "bob", 250000, 625)
+    assert res["ok"]
+    assert res["new_sender_balance"] == "47493.75"
+    assert res["new_recipient_balance"] == "3500.00"
+    assert db.get_balance("alice") == "47493.75"
+    assert db.get_balance("bob") == "3500.00"
+    tr = db.get_transfer("tr_1")
+    assert (tr["from"], tr["to"], tr["amount"], tr["fee"], tr["status"]) == (
+        "alice", "bob", "2500.00", "6.25", "COMPLETED",
+    )
+
+
+def test_transfer_insufficient_funds(db):
+    """A transfer the sender can't cover is recorded as FAILED and moves nothing"""
+    res = _transfer(db, "bob", "alice", 100000, 1)
+    assert res == {"ok": False, "error": "Insufficient funds", "transfer_id": "tr_1"}
+    assert db.get_balance("bob") == "1000.00"
+    assert db.get_balance("alice") == "50000.00"
+    tr = db.get_transfer("tr_1")
+    assert (tr["status"], tr["reason"]) == ("FAILED", "Insufficient funds")
+
+
+def test_transfer_unknown_recipient(db):
+    res = _transfer(db, "alice", "nobody", 100)
+    assert res == {"ok": False, "error": "Invalid recipient account"}
+    assert db.get_balance("alice") == "50000.00"
+    assert db.get_transfer("tr_1") is None
+
+
+def test_transfer_to_self(db):
+    res = _transfer(db, "alice", "alice", 100)
+    assert res == {"ok": False, "error": "Recipient cannot be the sender"}
+    assert db.get_balance("alice") == "50000.00"
+    assert db.get_transfer("tr_1") is None
+
+
+def _page_through(db, username, limit):
+    pages = []
+    cursor = {}
+    while True:
+        page = db.get_transfers_page(username, limit=limit, **cursor)
+        pages.append(page)
+        if not page:
+            return pages
+        last = page[-1]
+        cursor = {"before_created_at": last["created_at"], "before_transfer_id": last["transfer_id"]}
+
+
+def test_transfers_page_boundaries(db):
+    """Pages split ties on created_at cleanly and end with an empty page"""
+    # Same created_at for all of them, both directions
+    for i in range(7):
+        sender, recipient = ("alice", "bob") if i % 2 == 0 else ("bob", "alice")
+        assert _transfer(db, sender, recipient, 100, transfer_id=f"tr_{i}")["ok"]
+
+    pages = _page_through(db, "alice", 3)
+    assert [len(p) for p in pages] == [3, 3, 1, 0]
+    ids = [t["transfer_id"] for p in pages for t in p]
+    assert ids == [f"tr_{i}" for i in range(6, -1, -1)]
+    assert ids == [t["transfer_id"] for t in db.get_transfers_page("alice", limit=100)]
+
+    # An exactly full last page is followed by an empty one
+    assert [len(p) for p in _page_through(db, "bob", 7)] == [7, 0]
+
+
+def test_transfers_page_limit_clamped(db, monkeypatch):
+    for i in range(3):
+        assert _transfer(db, "alice", "bob", 100, transfer_id=f"tr_{i}")["ok"]
+    assert len(db.get_transfers_page("alice", limit=0)) == 1
+    monkeypatch.setattr(bdb_server, "MAX_TRANSFER_PAGE", 2)
+    assert len(db.get_transfers_page("alice", limit=10**6)) == 2
+    assert db.get_transfers_page("nobody") == []
+
+
+@pytest.mark.parametrize(
+    "amount,fee", [("2500.00", "6.25"), ("0.05", "0.00"), ("-1.50", "-0.25"), ("-0.05", "0.00")]
+)
+def test_transfer_read_paths_agree(db, amount, fee):
+    """get_transfer and the JSON list paths format amounts alike, sign included"""
+    assert db.create_transfer({
+        "transfer_id": "tr_1", "from": "alice", "to": "bob", "amount": amount, "fee": fee,
+        "status": "PENDING", "created_at": 1, "updated_at": 1,
+    })
+    tr = db.get_transfer("tr_1")
+    assert (tr["amount"], tr["fee"]) == (amount, fee)
+    assert db.get_transfers_by_user("alice") == [tr]
+    assert db.get_transfers_page("bob") == [tr]
+
+
+def _audit_details(db, operation):
+    return sorted(e["details"] for e in db.get_audit_logs(1000) if e["operation"] == operation)
+
+
+def test_update_transfer_audits_only_existing(db):
+    """Only an update that matched a transfer is audited"""
+    assert _transfer(db, "alice", "bob", 100)["ok"]
+    assert db.update_transfer("tr_1", "REVERSED")["status"] == "REVERSED"
+    assert db.update_transfer("tr_2", "REVERSED") is None
+    bdb_server._stop_audit_writer()
+    assert _audit_details(db, "TRANSFER_UPDATED") == ["Transfer tr_1 status: REVERSED"]
+
+
+def test_audit_entries_flushed_on_stop(db):
+    """Entries still queued are written when the audit writer stops"""
+    for i in range(3):
+        bdb_server.AUDIT_QUEUE.put(("TEST", "alice", f"entry {i}", i))
+    bdb_server._stop_audit_writer()
+    assert _audit_details(db, "TEST") == ["entry 0", "entry 1", "entry 2"]
+    assert _audit_details(db, "USER_CREATED") == ["Mock user initialized"] * 2
+
+
+class _LockedOnceConnection:
+    """Connection whose first audit INSERT fails as if the database were locked."""
+
+    def __init__(self, conn, error="database is locked"):
+        self._conn = conn
+        self.error = error
+        self.failures = 1
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+    def __enter__(self):
+        return self._conn.__enter__()
+
+    def __exit__(self, *exc):
+        return self._conn.__exit__(*exc)
+
+    def executemany(self, sql, rows):
+        if sql == bdb_server.AUDIT_INSERT and self.failures:
+            self.failures -= 1
+            raise sqlite3.OperationalError(self.error)
+        return self._conn.executemany(sql, rows)
+
+
+def test_audit_batch_retried_after_operational_error(db_file, monkeypatch, capsys):
+    """A batch whose write fails with OperationalError is written on retry, not dropped"""
+    writer_conns = []
+    connect = bdb_server._connect
+
+    def _connect():
+        conn = connect()
+        if threading.current_thread().name == "audit-writer":
+            conn = _LockedOnceConnection(conn)
+            writer_conns.append(conn)
+        return conn
+
+    monkeypatch.setattr(bdb_server, "_connect", _connect)
+    monkeypatch.setattr(bdb_server, "AUDIT_RETRY_DELAY", 0.01)
+    db = BankDatabaseServer()
+    bdb_server.AUDIT_QUEUE.put(("TEST", "alice", "kept", 0))
+    bdb_server.AUDIT_QUEUE.join()
+
+    assert [c.failures for c in writer_conns] == [0]
+    assert "retrying" in capsys.readouterr().out
+    assert _audit_details(db, "TEST") == ["kept"]
+    assert _audit_details(db, "USER_CREATED") == ["Mock user initialized"] * 2
+
+
+def test_audit_batch_dropped_after_other_operational_error(db_file, monkeypatch, capsys):
+    """Errors other than a locked database drop the batch instead of retrying forever"""
+    connect = bdb_server._connect
+
+    def _connect():
+        conn = connect()
+        if threading.current_thread().name == "audit-writer":
+            conn = _LockedOnceConnection(conn, "database or disk is full")
+        return conn
+
+    monkeypatch.setattr(bdb_server, "_connect", _connect)
+    db = BankDatabaseServer()
+    bdb_server.AUDIT_QUEUE.join()  # mock user entries hit the failure
+    bdb_server.AUDIT_QUEUE.put(("TEST", "alice", "kept", 0))
+    bdb_server.AUDIT_QUEUE.join()
+
+    out = capsys.readouterr().out
+    assert "entries lost: database or disk is full" in out
+    assert "retrying" not in out
+    assert _audit_details(db, "TEST") == ["kept"]
+    assert _audit_details(db, "USER_CREATED") == []
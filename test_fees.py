@@ -0,0 +1,138 @@
+"""
+Quick validation tests
+Checks imports, BAS construction and the fee table.
+
+Run from the repository root with `pytest` (or `pytest -n auto` when
+pytest-xdist is installed).
+"""
+
+from decimal import Decimal
+from typing import Optional
+
+import pytest
+
+from common import money, compute_fee, to_cents
+
+# Optional imports, attempted once; failures are reported by test_imports
+_IMPORT_ERRORS: dict[str, Exception] = {}
+try:
+    import Pyro5.api  # noqa: F401
+except ImportError as e:
+    _IMPORT_ERRORS["Pyro5.api"] = e
+try:
+    from bas_server import BankApplicationServer
+except ImportError as e:
+    _IMPORT_ERRORS["BankApplicationServer"] = e
+
+# (amount, expected fee) pairs, converted once at import
+_FEE_CASES = tuple(
+    (money(amount), money(expected))
+    for amount, expected in [
+        ("1000.00", "0.00"),
+        ("2000.00", "0.00"),
+        ("2000.01", "5.00"),
+        ("2500.00", "6.25"),
+        ("10000.00", "20.00"),
+        ("10000.01", "20.00"),
+        ("20000.00", "25.00"),
+        ("20000.01", "25.00"),
+        ("50000.00", "40.00"),
+        ("50000.01", "40.00"),
+        ("100000.00", "50.00"),
+        ("100000.01", "50.00"),
+        ("150000.00", "75.00"),
+    ]
+)
+
+
+@pytest.mark.parametrize(
+    "amount,expected_fee", _FEE_CASES, ids=[str(amount) for amount, _ in _FEE_CASES]
+)
+def test_fee(amount, expected_fee):
+    """Validate each fee table entry"""
+    assert compute_fee(amount) == expected_fee
+
+
+@pytest.mark.parametrize(
+    "text,expected",
+    [
+        ("1.005", "1.01"),
+        ("-1.005", "-1.01"),
+        ("1.004", "1.00"),
+        ("1.00\u0661", "1.00"),  # non-ASCII digit goes through Decimal
+        ("1e2", "100.00"),
+        ("92233720368547758.07", "92233720368547758.07"),  # largest 64-bit cents
+    ],
+)
+def test_money(text, expected):
+    """Parsing rounds half up to the cent, whatever the notation"""
+    assert str(money(text)) == expected
+
+
+@pytest.mark.parametrize(
+    "text",
+    ["92233720368547758.08", "-92233720368547758.08", "1" + "0" * 30 + ".005", "1e40", "nan"],
+)
+def test_money_out_of_range(text):
+    """Amounts beyond 64-bit cents are rejected rather than rounded"""
+    with pytest.raises(ValueError):
+        money(text)
+
+
+@pytest.mark.parametrize("first", [2001.995, Decimal(2001.995)], ids=["float", "Decimal"])
+def test_compute_fee_float_and_decimal_cached_apart(first):
+    """compute_fee keeps equal float and Decimal amounts apart too"""
+    compute_fee.cache_clear()
+    compute_fee(first)
+    assert str(compute_fee(2001.995)) == "5.01"  # 2002.00
+    assert str(compute_fee(Decimal(2001.995))) == "5.00"  # 2001.99
+
+
+@pytest.mark.parametrize("first", [2.675, Decimal(2.675)], ids=["float", "Decimal"])
+def test_money_float_and_decimal_cached_apart(first):
+    """Equal float and Decimal inputs keep their own rounding, whichever comes first"""
+    money.cache_clear()
+    money(first)
+    assert str(money(2.675)) == "2.68"  # str(2.675) is "2.675"
+    assert str(money(Decimal(2.675))) == "2.67"  # exactly 2.67499999...
+
+
+def test_to_cents_rejects_non_ascii_digits():
+    """Canonical money strings are ASCII only"""
+    with pytest.raises(ValueError):
+        to_cents("1.0\u0661")
+
+
+@pytest.mark.parametrize("name", ["Pyro5.api", "BankApplicationServer"])
+def test_imports(name):
+    """Verify all modules can be imported"""
+    assert name not in _IMPORT_ERRORS, f"Failed to import {name}: {_IMPORT_ERRORS.get(name)}"
+
+
+# One BAS instance, built on first use and shared by every test that needs it
+_SERVER: Optional["BankApplicationServer"] = None
+
+
+def _get_server() -> "BankApplicationServer":
+    global _SERVER
+    if _SERVER is None:
+        _SERVER = BankApplicationServer()
+    return _SERVER
+
+
+@pytest.fixture(scope="module")
+def server():
+    if "BankApplicationServer" in _IMPORT_ERRORS:
+        pytest.fail(f"Cannot import BankApplicationServer: {_IMPORT_ERRORS['BankApplicationServer']}")
+    return _get_server()
+
+
+def test_server_init(server):
+    """Verify server initializes correctly"""
+    assert server.sessions.get("no-such-token") is None
+
+
+def test_unknown_token_rejected(server):
+    """Calls with an unknown session token fail before reaching BDB"""
+    assert server.get_balance("no-such-token")["ok"] is False
+    assert server.logout("no-such-token")["ok"] is False